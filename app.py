@@ -1,17 +1,22 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
 from pathlib import Path
-import hashlib
+import os
 import re
-from io import StringIO
+import tempfile
 
 # =========================
 # Page & Global Styles
 # =========================
 st.set_page_config(page_title="Mumbai Rent Compare", layout="wide", page_icon=None)
 
-# Minimal CSS polish (emoji-free badges)
-st.markdown("""
+# Minimal CSS polish (emoji-free badges). Static markup lives in module constants
+# so reruns just pass the same strings through.
+PAGE_CSS = """
 <style>
 .hero {
   padding: 18px 20px;
@@ -34,44 +39,48 @@ st.markdown("""
 
 .data-hint { color: #667085; font-size: 13px; }
 .metric-card { border: 1px solid #eee; border-radius: 12px; padding: 14px; background: #fff; }
+.metric-value { font-size: 28px; font-weight: 700; color: #111; margin: 2px 0; }
 .small { font-size: 12px; color: #667085; }
 .compare-card { border:1px solid #eee; border-radius:12px; padding:14px; background:#fff; }
 .kv { display:flex; justify-content:space-between; margin:4px 0; font-size:14px; }
 .kv b { color:#111; }
 .kv span { color:#374151; }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# =========================
-# Cache-busting utilities
-# =========================
-def file_hash(path: str) -> str:
-    return hashlib.md5(Path(path).read_bytes()).hexdigest()
+HERO_HTML = """
+<div class="hero">
+  <h3 style="margin:0">Mumbai Rent Compare</h3>
+  <div class="data-hint">Ranking: Median 1BHK → Deposit → Proximity. Badges are rank-based (emoji-free for better Windows support).</div>
+  <div class="badge-legend" style="margin-top:8px;">
+    <span class="legend-chip chip-budget">Budget</span>
+    <span class="legend-chip chip-value">Value</span>
+    <span class="legend-chip chip-mid">Mid</span>
+    <span class="legend-chip chip-uppermid">Upper Mid</span>
+    <span class="legend-chip chip-premium">Premium</span>
+    <span class="legend-chip chip-luxury">Luxury</span>
+  </div>
+</div>
+"""
 
-@st.cache_data
-def load_data(path: str, version: str) -> pd.DataFrame:
-    return pd.read_csv(path)
+# Compare card: one templated block per area, filled by compare_card_html()
+COMPARE_CARD_HTML = "<div class='compare-card'><h4 style='margin:0'>{area}</h4>{rows}</div>"
+COMPARE_ROW_HTML  = "<div class='kv'><b>{}</b><span>{}</span></div>"
 
-csv_path = "mmr_rent_data.csv"
-version = file_hash(csv_path)
-df = load_data(csv_path, version)
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
 
 # =========================
 # Parsing & Ranking Logic
 # =========================
-for col in ["rent_median_1bhk", "rent_min_1bhk", "rent_max_1bhk"]:
-    df[col] = pd.to_numeric(df[col], errors="coerce")
+DEPOSIT_X_RE   = re.compile(r"(\d+(?:\.\d+)?)\s*x")
+DEPOSIT_NUM_RE = re.compile(r"(\d+(?:\.\d+)?)")
 
-def parse_deposit_ratio(s: str) -> float:
-    if pd.isna(s): return 4.0
-    s = str(s).lower().strip()
-    m = re.search(r"(\d+(\.\d+)?)\s*x", s)
-    if m: return float(m.group(1))
-    m2 = re.search(r"\d+(\.\d+)?", s)
-    if m2: return float(m2.group(0))
-    return 4.0
-
-df["deposit_months_min"] = df["deposit_ratio"].apply(parse_deposit_ratio)
+def parse_deposit_ratio(col: pd.Series) -> pd.Series:
+    # "2x-3x" → 2.0: first "<n>x", else first bare number, else 4 months
+    s = col.astype(str).str.lower().str.strip()
+    x = s.str.extract(DEPOSIT_X_RE, expand=False)
+    n = s.str.extract(DEPOSIT_NUM_RE, expand=False)
+    return pd.to_numeric(x.fillna(n), errors="coerce").fillna(4.0).astype(float)
 
 western_core = ["Bandra","Khar","Santacruz","Andheri","Jogeshwari","Goregaon","Malad","Kandivali","Borivali","Dahisar","Mira Road","Bhayander","Vasai","Naigaon","Nalasopara","Virar"]
 central_core = ["Dadar","Matunga","Sion","Kurla","Ghatkopar","Vikhroli","Bhandup","Mulund","Thane","Kalwa","Mumbra","Diva","Dombivli","Kalyan","Ambernath","Badlapur","Vangani","Titwala"]
@@ -79,58 +88,195 @@ harbour_core = ["Chembur","Govandi","Mankhurd"]
 south_core   = ["Lower Parel","Worli","Prabhadevi","Mahim","Wadala","Cuffe Parade","Malabar Hill","Colaba"]
 navi_core    = ["Vashi","Airoli","Kopar Khairane","Ghansoli","Turbhe","Sanpada","Seawoods","Nerul","Belapur","Kharghar","Kamothe","Ulwe","New Panvel","Panvel","Taloja"]
 
-def first_match_idx(area_lower: str, names: list[str]) -> int | None:
-    for idx, name in enumerate(names):
-        if name.lower() in area_lower:
-            return idx
-    return None
-
-def proximity_score(area: str, region: str) -> int:
-    a = (area or "").lower()
-    r = (region or "").lower()
-    if "south" in r or any(k.lower() in a for k in south_core):
-        idx = first_match_idx(a, south_core);   return idx if idx is not None else 0
-    if "western" in r or any(k.lower() in a for k in western_core):
-        idx = first_match_idx(a, western_core); return idx if idx is not None else 50
-    if "central" in r or any(k.lower() in a for k in central_core):
-        idx = first_match_idx(a, central_core); return idx if idx is not None else 50
-    if "harbour" in r or "chembur" in a:
-        idx = first_match_idx(a, harbour_core); return idx if idx is not None else 30
-    if "navi" in r or any(k.lower() in a for k in navi_core):
-        idx = first_match_idx(a, navi_core);    return idx if idx is not None else 40
-    return 60
-
-df["proximity_score"] = df.apply(lambda x: proximity_score(str(x["area"]), str(x["region"])), axis=1)
-
-# Global sort for rank: Median → Deposit → Proximity → Area
-df = df.sort_values(
-    by=["rent_median_1bhk", "deposit_months_min", "proximity_score", "area"],
-    ascending=[True, True, True, True]
-).reset_index(drop=True)
-
-df["global_rank"] = df["rent_median_1bhk"].rank(method="dense", ascending=True).astype("Int64")
-
-def rank_badge(rank_val: int) -> str:
-    if pd.isna(rank_val): return ""
-    r = int(rank_val)
-    if   1 <= r <= 15: return "Budget"
-    elif 16 <= r <= 25: return "Value"
-    elif 26 <= r <= 40: return "Mid"
-    elif 41 <= r <= 50: return "Upper Mid"
-    elif 51 <= r <= 55: return "Premium"
-    else:               return "Luxury"
-
-df["badge"] = df["global_rank"].apply(rank_badge)
+# (region keyword, lowercased core names by priority, fallback score, area triggers)
+# Names are lowered once at import; triggers=None means "any core name" puts an area in the tier.
+PROXIMITY_TIERS = [
+    ("south",   tuple(n.lower() for n in south_core),   0,  None),
+    ("western", tuple(n.lower() for n in western_core), 50, None),
+    ("central", tuple(n.lower() for n in central_core), 50, None),
+    ("harbour", tuple(n.lower() for n in harbour_core), 30, ("chembur",)),
+    ("navi",    tuple(n.lower() for n in navi_core),    40, None),
+]
+
+def first_match_idx(area_lower: pd.Series, names: tuple[str, ...]) -> pd.Series:
+    # Index of the first name (list order) found in each area, NaN where none match
+    idx = pd.Series(np.nan, index=area_lower.index)
+    for i in range(len(names) - 1, -1, -1):
+        idx = idx.mask(area_lower.str.contains(names[i], regex=False), i)
+    return idx
+
+def proximity_score(area: pd.Series, region: pd.Series) -> pd.Series:
+    a = area.astype(str).str.lower()
+    r = region.astype(str).str.lower()
+    conds, choices = [], []
+    # First matching tier wins, same priority as the region checks always had
+    for key, names, fallback, triggers in PROXIMITY_TIERS:
+        idx = first_match_idx(a, names)
+        hit = idx.notna() if triggers is None else first_match_idx(a, triggers).notna()
+        conds.append(r.str.contains(key, regex=False) | hit)
+        choices.append(idx.fillna(fallback))
+    score = np.select(conds, choices, default=60)
+    return pd.Series(score, index=area.index).astype(int)
+
+# Rank bands → badge: (0,15] Budget, (15,25] Value, ... (55,∞) Luxury
+BADGE_BINS   = [0, 15, 25, 40, 50, 55, np.inf]
+BADGE_LABELS = ["Budget", "Value", "Mid", "Upper Mid", "Premium", "Luxury"]
+
+# =========================
+# Cached data pipeline
+# =========================
+RENT_COLS = ["rent_median_1bhk", "rent_min_1bhk", "rent_max_1bhk"]
+
+def file_version(path: str) -> tuple[int, int]:
+    # stat() fingerprint: cheap enough to run on every rerun, unlike hashing the file
+    s = Path(path).stat()
+    return (s.st_mtime_ns, s.st_size)
+
+def build_df(path: str) -> pd.DataFrame:
+    # Typed columnar parse: rent columns arrive numeric, no to_numeric fix-up pass.
+    # float64, not an int type, so hand-edited values like "12000.0" still load.
+    tbl = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+        column_types={col: pa.float64() for col in RENT_COLS},
+        strings_can_be_null=True,
+    ))
+    df = tbl.to_pandas()
+    # Low-cardinality labels: int codes for isin/sort, categories come out sorted
+    for col in ["zone", "region", "deposit_ratio"]:
+        df[col] = df[col].astype("category")
+    df["area"] = df["area"].astype("string[pyarrow]")
+
+    df["deposit_months_min"] = parse_deposit_ratio(df["deposit_ratio"])
+    df["proximity_score"] = proximity_score(df["area"], df["region"])
+    # Sidebar search target; Arrow-backed (like area) so str.contains runs in Arrow's C++ kernels
+    df["area_lower"] = df["area"].str.lower()
+
+    # Global sort for rank: Median → Deposit → Proximity → Area (one lexsort on numeric keys)
+    area_codes = pd.Categorical(df["area"]).codes
+    order = np.lexsort((
+        area_codes,
+        df["proximity_score"].to_numpy(),
+        df["deposit_months_min"].to_numpy(),
+        df["rent_median_1bhk"].to_numpy(),
+    ))
+    df = df.take(order).reset_index(drop=True)
+    # Row position is now the global order; one int key stands in for all four above
+    df["_sort_key"] = np.arange(len(df))
+    df["_area_key"] = area_codes[order]  # A→Z position of each area, for display sorts
+
+    # Dense rank in one sort+inverse pass; plain int32 keeps the column unboxed for display
+    _, inv = np.unique(df["rent_median_1bhk"].to_numpy(), return_inverse=True)
+    df["global_rank"] = (inv + 1).astype(np.int32)
+    df["badge"] = pd.cut(df["global_rank"], bins=BADGE_BINS, labels=BADGE_LABELS)
+    return df
+
+# Display sorts: (keys, ascending). Area ties break on _area_key, its A→Z position.
+SORT_OPTIONS = {
+    "Global Rank (asc)":  (["global_rank", "_area_key"], [True, True]),
+    "Median 1BHK (asc)":  (["rent_median_1bhk", "_area_key"], [True, True]),
+    "Median 1BHK (desc)": (["rent_median_1bhk", "_area_key"], [False, True]),
+    "Area (A→Z)":         (["_area_key"], [True]),
+}
+ZONE_GROUP_SORT = "Zone-wise grouping"
+ZONE_GROUP_KEYS = (["zone", "_sort_key"], [True, True])
+
+def lexsort_order(frame: pd.DataFrame, keys: list[str], ascending: list[bool]) -> np.ndarray:
+    # Row positions from one stable np.lexsort over numeric key arrays (categoricals by code)
+    arrays = []
+    for key, asc in zip(reversed(keys), reversed(ascending)):
+        col = frame[key]
+        arr = col.cat.codes.to_numpy() if isinstance(col.dtype, pd.CategoricalDtype) else col.to_numpy()
+        arrays.append(arr if asc else -arr)
+    return np.lexsort(arrays)
+
+# Columns the app reads after prep. deposit_months_min/proximity_score only feed the
+# global order (_sort_key), so they're left out of the sidecar and the cached frame,
+# which st.cache_data copies out on every rerun.
+APP_COLS = [
+    "zone", "area", "region", *RENT_COLS, "deposit_ratio",
+    "area_lower", "_sort_key", "_area_key", "global_rank", "badge",
+]
+
+def sidecar_path(path: str, version: tuple[int, int]) -> Path:
+    # Keyed on this script too, so editing the enrichment code invalidates it as well
+    key = (*version, *file_version(__file__))
+    p = Path(path)
+    return p.with_name(f".{p.stem}_" + "_".join(map(str, key)) + ".feather")
+
+@st.cache_data
+def prepare_data(path: str, version: tuple[int, int]) -> tuple[
+    pd.DataFrame, list[str], int, int, tuple[str, ...],
+    dict[str, np.ndarray], dict[str, int], dict[str, np.ndarray], np.ndarray,
+    np.ndarray | None,
+]:
+    # Everything here depends only on the CSV, so widget reruns skip it entirely.
+    # Cold starts (new process, "Reload latest data") reuse the enriched frame from a
+    # Feather sidecar keyed on the file version instead of re-parsing the CSV.
+    cache = sidecar_path(path, version)
+    df = None
+    if cache.exists():
+        try:
+            df = feather.read_table(cache, columns=APP_COLS, memory_map=True).to_pandas()
+        except (OSError, pa.ArrowInvalid):
+            # Truncated/corrupt sidecar: drop it so the rebuild below replaces it
+            try:
+                cache.unlink()
+            except OSError:
+                pass
+        else:
+            # Feather round-trips the string dtype but not its Arrow storage
+            for col in ["area", "area_lower"]:
+                df[col] = df[col].astype("string[pyarrow]")
+    if df is None:
+        df = build_df(path)[APP_COLS]
+        tmp = None
+        try:
+            for stale in cache.parent.glob(f".{Path(path).stem}_*.feather"):
+                stale.unlink()
+            # Write beside the target, then rename over it: readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=cache.parent, prefix=cache.name, suffix=".tmp")
+            os.close(fd)
+            feather.write_feather(df, tmp)
+            os.replace(tmp, cache)
+        except OSError:
+            # read-only checkout: just rebuild next time
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    # Widget options/bounds (sidebar + compare selectboxes), so reruns don't recompute them either
+    zones = list(df["zone"].cat.categories)
+    min_rent = int(df["rent_median_1bhk"].min())
+    max_rent = int(df["rent_median_1bhk"].max())
+    areas_list = tuple(sorted(df["area"].dropna().unique().tolist()))  # dedupe first, sort the rest
+    # Full-frame order for every display sort, so reruns never sort
+    sort_orders = {name: lexsort_order(df, *spec) for name, spec in SORT_OPTIONS.items()}
+    sort_orders[ZONE_GROUP_SORT] = lexsort_order(df, *ZONE_GROUP_KEYS)
+    # Per-zone row bitmaps: the zone filter ORs a few of these instead of an isin pass
+    zone_codes = df["zone"].cat.codes.to_numpy()
+    zone_masks = {z: zone_codes == i for i, z in enumerate(zones)}
+    # Rows with no zone: excluded even with every zone selected (as isin() did)
+    has_zone = zone_codes >= 0
+    # First-paint mask: the rows the default filters keep (isin/between also drop a
+    # missing zone or median). None when that is every row, so there is nothing to filter.
+    listed = has_zone & df["rent_median_1bhk"].notna().to_numpy()
+    default_mask = None if listed.all() else listed
+    # area → row position (first occurrence) for the Compare lookups
+    area_to_idx = {}
+    for i, a in enumerate(df["area"].to_numpy()):
+        area_to_idx.setdefault(a, i)
+    return (df, zones, min_rent, max_rent, areas_list,
+            sort_orders, area_to_idx, zone_masks, has_zone, default_mask)
+
+csv_path = "mmr_rent_data.csv"
+version = file_version(csv_path)
+(df, zones, min_rent, max_rent, areas_list,
+ sort_orders, area_to_idx, zone_masks, has_zone, default_mask) = prepare_data(csv_path, version)
 
 # =========================
 # Sidebar Filters
 # =========================
 st.sidebar.header("Filters")
-zones = df["zone"].dropna().unique().tolist(); zones.sort()
 zone_selected = st.sidebar.multiselect("Zone choose karo", zones, default=zones)
 
-min_rent = int(df["rent_median_1bhk"].min())
-max_rent = int(df["rent_median_1bhk"].max())
 rent_range = st.sidebar.slider("1BHK Median (₹/mo)", min_rent, max_rent, (min_rent, max_rent), step=500)
 
 search = st.sidebar.text_input("Area search (optional)", "")
@@ -139,7 +285,7 @@ group_zone = st.sidebar.checkbox("Zone-wise grouping (optional)", value=False)
 # NEW: Sort options
 sort_choice = st.sidebar.selectbox(
     "Sort by",
-    ["Global Rank (asc)", "Median 1BHK (asc)", "Median 1BHK (desc)", "Area (A→Z)"],
+    list(SORT_OPTIONS),
     index=0
 )
 
@@ -150,20 +296,7 @@ if st.sidebar.button("Reload latest data"):
 # =========================
 # Hero + Legend + Metrics
 # =========================
-st.markdown(f"""
-<div class="hero">
-  <h3 style="margin:0">Mumbai Rent Compare</h3>
-  <div class="data-hint">Ranking: Median 1BHK → Deposit → Proximity. Badges are rank-based (emoji-free for better Windows support).</div>
-  <div class="badge-legend" style="margin-top:8px;">
-    <span class="legend-chip chip-budget">Budget</span>
-    <span class="legend-chip chip-value">Value</span>
-    <span class="legend-chip chip-mid">Mid</span>
-    <span class="legend-chip chip-uppermid">Upper Mid</span>
-    <span class="legend-chip chip-premium">Premium</span>
-    <span class="legend-chip chip-luxury">Luxury</span>
-  </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(HERO_HTML, unsafe_allow_html=True)
 
 # Quick stats
 total_areas = len(df)
@@ -171,56 +304,66 @@ cheapest_row = df.iloc[0]
 highest_row  = df.iloc[-1]
 c1, c2, c3 = st.columns(3)
 with c1:
-    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-    st.metric("Total Areas", f"{total_areas}")
-    st.markdown('<div class="small">Across full MMR coverage</div></div>', unsafe_allow_html=True)
+    st.markdown(
+        '<div class="metric-card"><div class="small">Total Areas</div>'
+        f'<div class="metric-value">{total_areas}</div>'
+        '<div class="small">Across full MMR coverage</div></div>',
+        unsafe_allow_html=True)
 with c2:
-    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-    st.metric("Cheapest Median (1BHK)", f"₹{int(cheapest_row['rent_median_1bhk']):,}", help=f"{cheapest_row['area']} • {cheapest_row['zone']}")
-    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown(
+        '<div class="metric-card"><div class="small">Cheapest Median (1BHK)</div>'
+        f'<div class="metric-value">₹{int(cheapest_row["rent_median_1bhk"]):,}</div>'
+        f'<div class="small">{cheapest_row["area"]} • {cheapest_row["zone"]}</div></div>',
+        unsafe_allow_html=True)
 with c3:
-    st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-    st.metric("Highest Median (1BHK)", f"₹{int(highest_row['rent_median_1bhk']):,}", help=f"{highest_row['area']} • {highest_row['zone']}")
-    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown(
+        '<div class="metric-card"><div class="small">Highest Median (1BHK)</div>'
+        f'<div class="metric-value">₹{int(highest_row["rent_median_1bhk"]):,}</div>'
+        f'<div class="small">{highest_row["area"]} • {highest_row["zone"]}</div></div>',
+        unsafe_allow_html=True)
 
 # =========================
 # Filter dataset
 # =========================
-mask = df["zone"].isin(zone_selected) & df["rent_median_1bhk"].between(*rent_range)
-if search.strip():
-    s = search.strip().lower()
-    mask &= df["area"].str.lower().str.contains(s)
-filtered = df.loc[mask].copy()
-
-# Sort for display
-if group_zone:
-    filtered = filtered.sort_values(
-        by=["zone","rent_median_1bhk","deposit_months_min","proximity_score","area"],
-        ascending=[True, True, True, True, True]
-    )
+# Columns the table shows (in this order) and the download reads; filtering copies only these
+FILTER_COLS = [
+    "global_rank","badge","zone","area","region",
+    "rent_median_1bhk","rent_min_1bhk","rent_max_1bhk","deposit_ratio",
+]
+
+all_zones = set(zone_selected) == set(zones)
+if all_zones and tuple(rent_range) == (min_rent, max_rent) and not search.strip():
+    # Widgets at their defaults (first paint): reuse the precomputed mask
+    mask = default_mask
 else:
-    if sort_choice == "Global Rank (asc)":
-        filtered = filtered.sort_values(by=["global_rank","area"], ascending=[True, True])
-    elif sort_choice == "Median 1BHK (asc)":
-        filtered = filtered.sort_values(by=["rent_median_1bhk","area"], ascending=[True, True])
-    elif sort_choice == "Median 1BHK (desc)":
-        filtered = filtered.sort_values(by=["rent_median_1bhk","area"], ascending=[False, True])
-    else:  # Area (A→Z)
-        filtered = filtered.sort_values(by=["area"], ascending=True)
+    # Plain ndarray booleans, all folded in place into one buffer: no index alignment
+    # and no extra result array per condition
+    med = df["rent_median_1bhk"].to_numpy()
+    mask = med >= rent_range[0]
+    mask &= med <= rent_range[1]
+    if all_zones:
+        mask &= has_zone
+    else:
+        zone_mask = np.zeros(len(df), dtype=bool)
+        for z in zone_selected:
+            zone_mask |= zone_masks[z]
+        mask &= zone_mask
+    if search.strip():
+        s = search.strip().lower()
+        mask &= df["area_lower"].str.contains(s, regex=False, na=False).to_numpy(dtype=bool)
+
+# Sort for display: each sort's full-frame row order is precomputed in prepare_data(),
+# so a rerun only gathers the surviving rows in that order (a masked subset stays sorted)
+sort_name = ZONE_GROUP_SORT if group_zone else sort_choice
+order = sort_orders[sort_name]
+rows = order if mask is None else order[mask[order]]
+filtered = df.iloc[rows, df.columns.get_indexer(FILTER_COLS)]
 
 # =========================
 # Table
 # =========================
 st.subheader("Areas (Global Rank + Badge)")
 
-def fmt_money(v):
-    try: return f"₹{int(v):,}"
-    except: return v
-
-show_cols = [
-    "global_rank","badge","zone","area","region",
-    "rent_median_1bhk","rent_min_1bhk","rent_max_1bhk","deposit_ratio"
-]
 rename = {
     "global_rank": "Rank",
     "badge": "Badge",
@@ -232,63 +375,81 @@ rename = {
     "rent_max_1bhk": "High",
     "deposit_ratio": "Deposit",
 }
-view = filtered[show_cols].rename(columns=rename)
-for col in ["Median 1BHK", "Low", "High"]:
-    view[col] = view[col].apply(fmt_money)
+view = filtered.rename(columns=rename)  # already projected to FILTER_COLS, in table order
+# Money columns stay numeric and are formatted client-side (still sort numerically)
+money = st.column_config.NumberColumn(format="₹%d")
 
-st.dataframe(view, use_container_width=True, hide_index=True)
+st.dataframe(view, use_container_width=True, hide_index=True,
+             column_config={"Median 1BHK": money, "Low": money, "High": money})
 
 # =========================
 # Compare 2 Areas (new)
 # =========================
 st.markdown("### Compare 2 Areas")
-areas_list = df["area"].dropna().sort_values().unique().tolist()
-colA, colB = st.columns(2)
-with colA:
-    a1 = st.selectbox("Area A", areas_list, index=0)
-with colB:
-    a2 = st.selectbox("Area B", areas_list, index=min(1, len(areas_list)-1))
 
 def area_row(a):
-    return df.loc[df["area"]==a].iloc[0]
-
-if a1 and a2:
-    r1, r2 = area_row(a1), area_row(a2)
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown(f"<div class='compare-card'><h4 style='margin:0'>{a1}</h4>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Rank</b><span>{int(r1['global_rank'])}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Badge</b><span>{r1['badge']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Zone</b><span>{r1['zone']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Region</b><span>{r1['region']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Median 1BHK</b><span>₹{int(r1['rent_median_1bhk']):,}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Low–High</b><span>₹{int(r1['rent_min_1bhk']):,} – ₹{int(r1['rent_max_1bhk']):,}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Deposit</b><span>{r1['deposit_ratio']}</span></div></div>", unsafe_allow_html=True)
-    with c2:
-        st.markdown(f"<div class='compare-card'><h4 style='margin:0'>{a2}</h4>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Rank</b><span>{int(r2['global_rank'])}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Badge</b><span>{r2['badge']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Zone</b><span>{r2['zone']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Region</b><span>{r2['region']}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Median 1BHK</b><span>₹{int(r2['rent_median_1bhk']):,}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Low–High</b><span>₹{int(r2['rent_min_1bhk']):,} – ₹{int(r2['rent_max_1bhk']):,}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='kv'><b>Deposit</b><span>{r2['deposit_ratio']}</span></div></div>", unsafe_allow_html=True)
+    return df.iloc[area_to_idx[a]]
+
+@st.cache_data
+def compare_card_html(area: str, version: tuple[int, int]) -> str:
+    # One string per area and data version; df/area_to_idx are read as module globals
+    r = area_row(area)
+    rows = [
+        ("Rank", int(r["global_rank"])),
+        ("Badge", r["badge"]),
+        ("Zone", r["zone"]),
+        ("Region", r["region"]),
+        ("Median 1BHK", f"₹{int(r['rent_median_1bhk']):,}"),
+        ("Low–High", f"₹{int(r['rent_min_1bhk']):,} – ₹{int(r['rent_max_1bhk']):,}"),
+        ("Deposit", r["deposit_ratio"]),
+    ]
+    return COMPARE_CARD_HTML.format(
+        area=area, rows="".join(COMPARE_ROW_HTML.format(k, v) for k, v in rows))
+
+@st.fragment
+def compare_section(areas_list: tuple[str, ...], version: tuple[int, int]) -> None:
+    # Fragment: changing Area A/B reruns only this block, not the filter/table/download above
+    colA, colB = st.columns(2)
+    with colA:
+        a1 = st.selectbox("Area A", areas_list, index=0)
+    with colB:
+        a2 = st.selectbox("Area B", areas_list, index=min(1, len(areas_list)-1))
+
+    if a1 and a2:
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown(compare_card_html(a1, version), unsafe_allow_html=True)
+        with c2:
+            st.markdown(compare_card_html(a2, version), unsafe_allow_html=True)
+
+compare_section(areas_list, version)
 
 # =========================
 # Download filtered CSV
 # =========================
-csv_buf = StringIO()
-download_cols = filtered[[
-    "global_rank","zone","area","region","rent_median_1bhk","rent_min_1bhk","rent_max_1bhk","deposit_ratio","badge"
-]].rename(columns={
-    "global_rank":"rank",
-    "badge":"rank_badge",
-    "rent_median_1bhk":"median_1bhk",
-    "rent_min_1bhk":"low",
-    "rent_max_1bhk":"high",
-})
-download_cols.to_csv(csv_buf, index=False)
-st.download_button("Download filtered CSV", csv_buf.getvalue(), file_name="mumbai_rent_compare_filtered.csv", mime="text/csv")
+@st.cache_data(max_entries=32)
+def to_csv_bytes(_frame: pd.DataFrame, version: tuple[int, int], zones_key: tuple[str, ...],
+                 rent_range: tuple[int, int], search: str, sort_name: str) -> bytes:
+    # Keyed on the data version + filter/sort inputs that produced _frame (underscore:
+    # Streamlit doesn't hash it), so reruns with unchanged filters skip even hashing the frame.
+    # Bounded: the key is raw widget input, so every search/slider position is a new entry.
+    download_cols = _frame[[
+        "global_rank","zone","area","region","rent_median_1bhk","rent_min_1bhk","rent_max_1bhk","deposit_ratio","badge"
+    ]].rename(columns={
+        "global_rank":"rank",
+        "badge":"rank_badge",
+        "rent_median_1bhk":"median_1bhk",
+        "rent_min_1bhk":"low",
+        "rent_max_1bhk":"high",
+    })
+    # Arrow's C++ writer emits UTF-8 bytes directly, no intermediate Python str
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(pa.Table.from_pandas(download_cols, preserve_index=False), buf)
+    return buf.getvalue().to_pybytes()
+
+csv_bytes = to_csv_bytes(filtered, version, tuple(sorted(zone_selected)), tuple(rent_range),
+                         search.strip().lower(), sort_name)
+st.download_button("Download filtered CSV", csv_bytes, file_name="mumbai_rent_compare_filtered.csv", mime="text/csv")
 
 st.markdown("---")
 st.caption("© Open approach; private portals ki scraping nahi. User-submitted & open sources only. Data ranges are indicative.")